@@ -4,10 +4,13 @@ Parse Weather data-Monitored.xlsx and convert to JSON format for the thermal DT
 Each sheet represents a different test point with different measurement parameters.
 """
 
-import json
+import argparse
 import os
-from datetime import datetime
-import openpyxl
+from contextlib import nullcontext
+from datetime import date, datetime, time
+import numpy as np
+import orjson
+from python_calamine import CalamineWorkbook
 
 # Test point coordinates (from the field measurement setup)
 TESTPOINT_COORDINATES = {
@@ -61,118 +64,140 @@ SHEET_TO_PARAM = {
     "Radiation": "radiation_components",
 }
 
-def parse_excel_file(filepath):
-    """Parse the Excel file and extract data from all sheets."""
+# Row timestamp builders keyed by type(date_val); other types give no timestamp.
+# Dates and datetimes are already isoformat strings by the time rows get here.
+TIMESTAMP_BUILDERS = {
+    str: lambda date_val, time_val: f"{date_val} {time_val}" if isinstance(time_val, str) else None,
+    time: lambda date_val, time_val: date_val.isoformat(),
+}
+
+def row_timestamp(row_data):
+    """Create a timestamp from the row's Date and Time columns, if available."""
+    date_val = row_data.get("Date")
+    time_val = row_data.get("Time")
+    if not (date_val and time_val):
+        return None
+    builder = TIMESTAMP_BUILDERS.get(type(date_val))
+    return builder(date_val, time_val) if builder else None
+
+def whole_number(val):
+    """Return float cells holding a whole number as int, as openpyxl read them.
+    
+    Calamine reads every number as float. Values beyond 2**53 stay float, since
+    floats that large are all whole and orjson rejects ints over 64 bits.
+    """
+    if isinstance(val, float) and val.is_integer() and abs(val) < 2**53:
+        return int(val)
+    return val
+
+def parse_excel_file(filepath, full_output=None):
+    """Parse the Excel file and extract testpoint data from all sheets.
+    
+    If full_output (a binary file) is given, every parsed row is also streamed
+    to it as a JSON line of the form {"sheet": ..., "row": {...}}.
+    """
     print(f"Loading Excel file: {filepath}")
-    wb = openpyxl.load_workbook(filepath, data_only=True)
+    wb = CalamineWorkbook.from_path(filepath)
     
-    all_data = {}
     testpoint_data = {}  # Organized by testpoint
     
-    for sheet_name in wb.sheetnames:
+    for sheet_name in wb.sheet_names:
         print(f"Processing sheet: {sheet_name}")
-        sheet = wb[sheet_name]
+        rows = iter(wb.get_sheet_by_name(sheet_name).to_python(skip_empty_area=False))
         
         # Get header row (first row)
-        headers = []
-        for col in range(1, sheet.max_column + 1):
-            val = sheet.cell(row=1, column=col).value
-            headers.append(str(val) if val else f"col_{col}")
+        headers = [str(whole_number(val)) if val else f"col_{col}" for col, val in enumerate(next(rows, ()), 1)]
         
         # Parse data rows
         sheet_data = []
-        for row in range(2, sheet.max_row + 1):
+        for row in rows:
             row_data = {}
-            for col, header in enumerate(headers, 1):
-                val = sheet.cell(row=row, column=col).value
-                if val is not None:
+            for header, val in zip(headers, row):
+                if val is not None and val != "":  # Empty cells read as ""
                     # Handle datetime
                     if isinstance(val, datetime):
                         row_data[header] = val.isoformat()
+                    # Calamine reads date-only cells as date; openpyxl gave midnight datetimes
+                    elif isinstance(val, date):
+                        row_data[header] = datetime.combine(val, time()).isoformat()
                     else:
-                        row_data[header] = val
+                        row_data[header] = whole_number(val)
             if row_data:  # Only add non-empty rows
                 sheet_data.append(row_data)
-        
-        all_data[sheet_name] = {
-            "headers": headers,
-            "data": sheet_data,
-            "row_count": len(sheet_data)
-        }
+                if full_output is not None:
+                    full_output.write(orjson.dumps({"sheet": sheet_name, "row": row_data}, default=str) + b"\n")
         
         # Extract testpoint-specific data
+        if not sheet_data:
+            continue
         param_name = SHEET_TO_PARAM.get(sheet_name, sheet_name)
+        
+        # Find testpoint columns and their measurement lists once per sheet
+        tp_columns = []  # (header, measurement list)
+        for header in headers:
+            if "Testpoint" in header:
+                testpoint_id = next(part for part in header.split("_") if "Testpoint" in part)
+                testpoint = testpoint_data.setdefault(testpoint_id, {
+                    "coordinates": TESTPOINT_COORDINATES.get(testpoint_id, {"lat": 22.418, "lng": 114.206}),
+                    "device": DEVICE_TYPES.get(testpoint_id, {"type": "Unknown", "sensors": [], "category": "unknown"}),
+                    "measurements": {}
+                })
+                tp_columns.append((header, testpoint["measurements"].setdefault(param_name, [])))
+        
         for row_data in sheet_data:
-            # Find testpoint columns
-            for header in headers:
-                if "Testpoint" in header:
-                    # Extract testpoint ID
-                    parts = header.split("_")
-                    for part in parts:
-                        if "Testpoint" in part:
-                            testpoint_id = part.replace("-", "-")
-                            break
-                    else:
-                        continue
-                    
-                    if testpoint_id not in testpoint_data:
-                        testpoint_data[testpoint_id] = {
-                            "coordinates": TESTPOINT_COORDINATES.get(testpoint_id, {"lat": 22.418, "lng": 114.206}),
-                            "device": DEVICE_TYPES.get(testpoint_id, {"type": "Unknown", "sensors": [], "category": "unknown"}),
-                            "measurements": {}
-                        }
-                    
-                    # Add measurement data
-                    if param_name not in testpoint_data[testpoint_id]["measurements"]:
-                        testpoint_data[testpoint_id]["measurements"][param_name] = []
-                    
-                    # Create timestamp from No, Date, Time columns if available
-                    timestamp = None
-                    if "Date" in row_data and "Time" in row_data:
-                        try:
-                            date_val = row_data.get("Date", "")
-                            time_val = row_data.get("Time", "")
-                            if date_val and time_val:
-                                if isinstance(date_val, str) and isinstance(time_val, str):
-                                    timestamp = f"{date_val} {time_val}"
-                                elif hasattr(date_val, 'isoformat'):
-                                    timestamp = date_val.isoformat()
-                        except:
-                            pass
-                    
-                    value = row_data.get(header)
-                    if value is not None and value != "":
-                        testpoint_data[testpoint_id]["measurements"][param_name].append({
-                            "timestamp": timestamp or row_data.get("No", ""),
-                            "value": float(value) if isinstance(value, (int, float)) else value
-                        })
+            # Create timestamp from No, Date, Time columns if available
+            timestamp = row_timestamp(row_data) or row_data.get("No", "")
+            
+            # Add measurement data
+            for header, measurements in tp_columns:
+                value = row_data.get(header)
+                if value is not None and value != "":
+                    measurements.append({
+                        "timestamp": timestamp,
+                        "value": float(value) if isinstance(value, (int, float)) else value
+                    })
     
-    return all_data, testpoint_data
+    wb.close()
+    return testpoint_data
 
 def generate_summary(testpoint_data):
     """Generate summary statistics for each testpoint."""
     summary = {}
     
     for testpoint_id, data in testpoint_data.items():
+        statistics = {}
         summary[testpoint_id] = {
             "coordinates": data["coordinates"],
             "device": data["device"],
-            "statistics": {}
+            "statistics": statistics
         }
         
         for param, measurements in data.get("measurements", {}).items():
-            values = [m["value"] for m in measurements if isinstance(m.get("value"), (int, float))]
-            if values:
-                summary[testpoint_id]["statistics"][param] = {
-                    "min": round(min(values), 2),
-                    "max": round(max(values), 2),
-                    "avg": round(sum(values) / len(values), 2),
-                    "count": len(values)
+            values = np.fromiter(
+                (m["value"] for m in measurements if isinstance(m.get("value"), (int, float))),
+                dtype=np.float64,
+            )
+            if values.size:
+                statistics[param] = {
+                    "min": round(float(values.min()), 2),
+                    "max": round(float(values.max()), 2),
+                    "avg": round(float(values.mean()), 2),
+                    "count": int(values.size)
                 }
     
     return summary
 
+def write_json(path, obj):
+    """Write obj to path as indented JSON."""
+    with open(path, "wb") as f:
+        f.write(orjson.dumps(obj, default=str, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY))
+
 def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--full", action="store_true",
+                        help="also write every parsed row to monitored_data_full.jsonl")
+    args = parser.parse_args()
+    
     # Paths
     script_dir = os.path.dirname(os.path.abspath(__file__))
     project_root = os.path.dirname(script_dir)
@@ -182,25 +207,22 @@ def main():
     # Create output directory
     os.makedirs(output_dir, exist_ok=True)
     
-    # Parse Excel
-    all_data, testpoint_data = parse_excel_file(excel_path)
+    # Parse Excel, streaming the full row dump only when requested
+    full_path = os.path.join(output_dir, "monitored_data_full.jsonl")
+    with open(full_path, "wb") if args.full else nullcontext() as full_output:
+        testpoint_data = parse_excel_file(excel_path, full_output)
+    if args.full:
+        print(f"Saved full data to {full_path}")
     
     # Generate summary
     summary = generate_summary(testpoint_data)
     
-    # Save all data (full)
-    with open(os.path.join(output_dir, "monitored_data_full.json"), "w") as f:
-        json.dump(all_data, f, indent=2, default=str)
-    print(f"Saved full data to {output_dir}/monitored_data_full.json")
-    
     # Save testpoint organized data
-    with open(os.path.join(output_dir, "testpoint_data.json"), "w") as f:
-        json.dump(testpoint_data, f, indent=2, default=str)
+    write_json(os.path.join(output_dir, "testpoint_data.json"), testpoint_data)
     print(f"Saved testpoint data to {output_dir}/testpoint_data.json")
     
     # Save summary
-    with open(os.path.join(output_dir, "testpoint_summary.json"), "w") as f:
-        json.dump(summary, f, indent=2)
+    write_json(os.path.join(output_dir, "testpoint_summary.json"), summary)
     print(f"Saved summary to {output_dir}/testpoint_summary.json")
     
     # Print summary
@@ -4,12 +4,20 @@ Parse Weather data-Monitored.xlsx and create properly structured JSON data for t
 Version 2: Better organization by test point number with proper coordinates.
 """
 
-import json
+import argparse
+import glob
 import os
+import pickle
 import re
-from datetime import datetime, time
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, time, timedelta
+from functools import lru_cache
+from itertools import repeat
 
-import openpyxl
+import numpy as np
+import orjson
+import pandas as pd
 
 # Test point coordinates (from Google Maps)
 TESTPOINT_COORDINATES = {
@@ -36,12 +44,51 @@ DEVICE_INFO = {
     "Radiation Tracker": {"sensors": ["DHI", "DNI", "GHI"], "color": "#a855f7"},
 }
 
+# Sheet name to parameter mapping
+SHEET_PARAM_MAPPING = {
+    "HOBO_Temp": {"param": "temperature", "unit": "°C"},
+    "HOBO_RH": {"param": "relative_humidity", "unit": "%"},
+    "HOBO_Light": {"param": "light", "unit": "lux"},
+    "HOBO_Dew_point": {"param": "dew_point", "unit": "°C"},
+    "Thermocouple_Temp": {"param": "surface_temperature", "unit": "°C"},
+    "GlobE_temp": {"param": "globe_temperature", "unit": "°C"},
+    "Wind_direction": {"param": "wind_direction", "unit": "°"},
+    "Wind_speed": {"param": "wind_speed", "unit": "m/s"},
+    "Solar_radiation": {"param": "solar_radiation", "unit": "W/m²"},
+    "Air_temp": {"param": "air_temperature", "unit": "°C"},
+    "RH": {"param": "rh_station", "unit": "%"},
+    "PM10": {"param": "pm10", "unit": "μg/m³"},
+    "PM25": {"param": "pm25", "unit": "μg/m³"},
+    "Pressure": {"param": "pressure", "unit": "kPa"},
+    "Radiation": {"param": "radiation", "unit": "W/m²"},
+}
+
+# Timeseries keys are whole minutes since the Excel date epoch
+EXCEL_EPOCH = datetime(1899, 12, 30)
+MINUTES_PER_DAY = 24 * 60
+
+# Testpoint ID in column headers, e.g. "RH , % (Testpoint-6)" or "PM10_testpoint-10 (μg/m3)"
+TESTPOINT_RE = re.compile(r'Testpoint[-_]?(\d+)', re.IGNORECASE)
+
 def extract_testpoint_number(header):
     """Extract testpoint number from column header."""
-    match = re.search(r'Testpoint[-_]?(\d+)', header, re.IGNORECASE)
-    if match:
-        return int(match.group(1))
-    return None
+    match = TESTPOINT_RE.search(header)
+    return int(match.group(1)) if match else None
+
+def column_values(df, col_idx):
+    """Return a column as Python objects, with empty cells as None."""
+    if col_idx is None:
+        return [None] * len(df)
+    col = df.iloc[:, col_idx].astype(object)
+    return col.where(col.notna(), None).tolist()
+
+def numeric_cells(df, col_idxs):
+    """Return columns as float64, with cells that aren't int/float (text, dates) as NaN."""
+    def mask(col):
+        if pd.api.types.is_numeric_dtype(col):
+            return col
+        return col.map(lambda v: v if isinstance(v, (int, float)) else np.nan)
+    return df.iloc[:, col_idxs].apply(mask).to_numpy(dtype=np.float64)
 
 def parse_time_to_minutes(time_val):
     """Convert time to minutes since midnight for indexing."""
@@ -57,48 +104,129 @@ def parse_time_to_minutes(time_val):
             return None
     return None
 
+@lru_cache(maxsize=None, typed=True)
 def normalize_timestamp(date_val, time_val):
-    """Normalize date/time values to a consistent timestamp string.
+    """Normalize date/time values to an integer timeseries key.
     
     The Time column in Excel contains full datetime (e.g., 2025-10-18 09:09:50).
     We extract both date and time from the time_val if it's a datetime object.
-    Returns format: "10-18 09:09" for display.
+    Returns whole minutes since EXCEL_EPOCH; use format_timestamp for display.
+    Cached for the row-by-row fallback in timestamp_keys, where repeated
+    (date, time) pairs within a sheet are normalized once.
     """
     # If time_val is a full datetime, extract both date and time from it
     if isinstance(time_val, datetime):
-        return time_val.strftime("%m-%d %H:%M")
+        return (time_val - EXCEL_EPOCH) // timedelta(minutes=1)
     
     # Fallback: try to construct from separate date and time
-    time_str = None
-    date_str = None
+    minutes = None
+    days = None
     
     if isinstance(time_val, time):
-        time_str = time_val.strftime("%H:%M")
+        minutes = time_val.hour * 60 + time_val.minute
     elif isinstance(time_val, str) and ':' in time_val:
         try:
             parts = time_val.split(':')
-            time_str = f"{int(parts[0]):02d}:{int(parts[1]):02d}"
+            minutes = int(parts[0]) * 60 + int(parts[1])
         except:
             pass
     
     if isinstance(date_val, datetime):
-        date_str = date_val.strftime("%m-%d")
+        days = (date_val - EXCEL_EPOCH).days
     elif isinstance(date_val, (int, float)):
-        from datetime import timedelta
-        excel_epoch = datetime(1899, 12, 30)
-        actual_date = excel_epoch + timedelta(days=int(date_val))
-        date_str = actual_date.strftime("%m-%d")
-    
-    if date_str and time_str:
-        return f"{date_str} {time_str}"
-    elif time_str:
-        return time_str
-    return None
+        days = int(date_val)
+    
+    if days is not None and minutes is not None:
+        return days * MINUTES_PER_DAY + minutes
+    # Time of day only; format_timestamp renders keys below one day as "HH:MM"
+    return minutes
+
+def format_timestamp(ts_key):
+    """Format a normalize_timestamp key for display, e.g. "10-18 09:09"."""
+    fmt = "%m-%d %H:%M" if ts_key >= MINUTES_PER_DAY else "%H:%M"
+    return (EXCEL_EPOCH + timedelta(minutes=ts_key)).strftime(fmt)
+
+def downcast_samples(values):
+    """Return values as float32 if that keeps every value and the mean at the reported 2-decimal precision."""
+    narrow = values.astype(np.float32)
+    if (np.array_equal(np.round(narrow.astype(np.float64), 2), np.round(values, 2))
+            and round(float(narrow.mean(dtype=np.float64)), 2) == round(float(values.mean()), 2)):
+        return narrow
+    return values
+
+def timestamp_keys(df, date_col, time_col):
+    """Return the normalize_timestamp key of every row as floats (NaN for no key).
+    
+    Full datetimes in the Time column and Excel serial numbers in the Date
+    column are converted column-wise; other layouts fall back to
+    normalize_timestamp row by row.
+    """
+    times = df.iloc[:, time_col] if time_col is not None else None
+    if times is not None and pd.api.types.is_datetime64_any_dtype(times):
+        return ((times - EXCEL_EPOCH) // pd.Timedelta(minutes=1)).to_numpy(dtype=np.float64)
+    
+    time_values = column_values(df, time_col)
+    dates = df.iloc[:, date_col] if date_col is not None else None
+    if (dates is not None and pd.api.types.is_numeric_dtype(dates)
+            and all(t is None or isinstance(t, time) for t in time_values)):
+        days = np.floor(dates.to_numpy(dtype=np.float64))
+        minutes = np.array([np.nan if t is None else t.hour * 60 + t.minute for t in time_values], dtype=np.float64)
+        # Rows without a date keep a time-of-day key, as in normalize_timestamp
+        return np.where(np.isnan(days), minutes, days * MINUTES_PER_DAY + minutes)
+    
+    keys = [normalize_timestamp(d, t) for d, t in zip(column_values(df, date_col), time_values)]
+    return np.array([np.nan if k is None else k for k in keys], dtype=np.float64)
+
+def parse_sheet(filepath, sheet_name):
+    """Parse one sheet into per-testpoint samples and the last value per timestamp.
+    
+    Runs in a worker process, so it reopens the workbook by path.
+    """
+    # Read testpoint columns as object so numeric text stays str for numeric_cells to mask
+    columns = pd.read_excel(filepath, sheet_name=sheet_name, engine="calamine", nrows=0).columns
+    tp_dtypes = {col: object for col in columns if extract_testpoint_number(str(col))}
+    df = pd.read_excel(filepath, sheet_name=sheet_name, engine="calamine", nrows=2998, dtype=tp_dtypes)  # Limit rows for performance
+    param_info = SHEET_PARAM_MAPPING.get(sheet_name, {"param": sheet_name.lower(), "unit": ""})
+    
+    # Get headers
+    headers = [str(col) for col in df.columns]
+    
+    # Find date/time and testpoint columns
+    date_col = next((i for i, h in enumerate(headers) if h.lower() == "date"), None)
+    time_col = next((i for i, h in enumerate(headers) if h.lower() == "time"), None)
+    tp_columns = {}  # testpoint_number -> [col_index, ...]
+    for col_idx, header in enumerate(headers):
+        tp_num = extract_testpoint_number(header)
+        if tp_num:
+            tp_columns.setdefault(tp_num, []).append(col_idx)
+    
+    # Resolve one timestamp per row and factorize into group indices
+    ts_idx, unique_ts = pd.factorize(timestamp_keys(df, date_col, time_col))
+    unique_ts = unique_ts.astype(np.int64)
+    
+    samples = {}  # {tp_num: value array}
+    series = {}  # {tp_num: (ts_key array, value array)}
+    for tp_num, col_idxs in tp_columns.items():
+        # Flatten row-major so later cells win, as in a row-by-row scan
+        values = numeric_cells(df, col_idxs).ravel()
+        valid = ~np.isnan(values)
+        if not valid.any():
+            continue
+        samples[tp_num] = downcast_samples(values[valid])
+        
+        # Keep the last value per timestamp
+        groups = np.repeat(ts_idx, len(col_idxs))
+        keep = valid & (groups >= 0)
+        last = pd.Series(values[keep]).groupby(groups[keep], sort=False).last()
+        series[tp_num] = (unique_ts[last.index], last.to_numpy())
+    
+    return param_info, samples, series
 
 def parse_excel_file(filepath):
     """Parse the Excel file and organize data by testpoint number."""
     print(f"Loading Excel file: {filepath}")
-    wb = openpyxl.load_workbook(filepath, data_only=True)
+    with pd.ExcelFile(filepath, engine="calamine") as xls:
+        sheet_names = xls.sheet_names
     
     # Initialize structure for each testpoint
     testpoints = {}
@@ -115,130 +243,119 @@ def parse_excel_file(filepath):
             "timeseries": []
         }
     
-    # Process each sheet
-    sheet_param_mapping = {
-        "HOBO_Temp": {"param": "temperature", "unit": "°C"},
-        "HOBO_RH": {"param": "relative_humidity", "unit": "%"},
-        "HOBO_Light": {"param": "light", "unit": "lux"},
-        "HOBO_Dew_point": {"param": "dew_point", "unit": "°C"},
-        "Thermocouple_Temp": {"param": "surface_temperature", "unit": "°C"},
-        "GlobE_temp": {"param": "globe_temperature", "unit": "°C"},
-        "Wind_direction": {"param": "wind_direction", "unit": "°"},
-        "Wind_speed": {"param": "wind_speed", "unit": "m/s"},
-        "Solar_radiation": {"param": "solar_radiation", "unit": "W/m²"},
-        "Air_temp": {"param": "air_temperature", "unit": "°C"},
-        "RH": {"param": "rh_station", "unit": "%"},
-        "PM10": {"param": "pm10", "unit": "μg/m³"},
-        "PM25": {"param": "pm25", "unit": "μg/m³"},
-        "Pressure": {"param": "pressure", "unit": "kPa"},
-        "Radiation": {"param": "radiation", "unit": "W/m²"},
-    }
-    
-    all_timeseries = {}  # {(date, time): {tp_num: {param: value}}}
-    
-    for sheet_name in wb.sheetnames:
-        print(f"Processing sheet: {sheet_name}")
-        sheet = wb[sheet_name]
-        
-        param_info = sheet_param_mapping.get(sheet_name, {"param": sheet_name.lower(), "unit": ""})
-        param_name = param_info["param"]
-        param_unit = param_info["unit"]
-        
-        # Get headers
-        headers = []
-        for col in range(1, sheet.max_column + 1):
-            val = sheet.cell(row=1, column=col).value
-            headers.append(str(val) if val else "")
-        
-        # Find testpoint columns
-        tp_columns = {}  # col_index -> testpoint_number
-        for col_idx, header in enumerate(headers):
-            tp_num = extract_testpoint_number(header)
-            if tp_num:
-                tp_columns[col_idx] = tp_num
-        
-        # Parse data rows
-        for row in range(2, min(sheet.max_row + 1, 3000)):  # Limit rows for performance
-            # Get date and time
-            date_val = None
-            time_val = None
+    all_timeseries = {}  # {ts_minutes: {tp_num: {param: value}}}
+    samples = {}  # {(tp_num, param): [value arrays, float32 where lossless]}
+    param_units = {}
+    
+    # Sheets are independent, so parse them in parallel and merge in sheet order
+    with ProcessPoolExecutor() as executor:
+        results = executor.map(parse_sheet, repeat(filepath), sheet_names)
+        for sheet_name, (param_info, sheet_samples, sheet_series) in zip(sheet_names, results):
+            print(f"Processing sheet: {sheet_name}")
+            param_name = param_info["param"]
             
-            for col_idx, header in enumerate(headers):
-                if header.lower() == "date":
-                    date_val = sheet.cell(row=row, column=col_idx + 1).value
-                elif header.lower() == "time":
-                    time_val = sheet.cell(row=row, column=col_idx + 1).value
+            for tp_num, arr in sheet_samples.items():
+                samples.setdefault((tp_num, param_name), []).append(arr)
+                param_units.setdefault(param_name, param_info["unit"])
             
-            # Get values for each testpoint
-            for col_idx, tp_num in tp_columns.items():
-                value = sheet.cell(row=row, column=col_idx + 1).value
-                if value is not None and isinstance(value, (int, float)):
-                    # Store in measurements
-                    if param_name not in testpoints[tp_num]["measurements"]:
-                        testpoints[tp_num]["measurements"][param_name] = {
-                            "unit": param_unit,
-                            "values": [],
-                            "min": float('inf'),
-                            "max": float('-inf'),
-                            "sum": 0,
-                            "count": 0
-                        }
-                    
-                    m = testpoints[tp_num]["measurements"][param_name]
-                    m["values"].append(value)
-                    m["min"] = min(m["min"], value)
-                    m["max"] = max(m["max"], value)
-                    m["sum"] += value
-                    m["count"] += 1
-                    
-                    # Build timeseries key using normalized timestamp
-                    ts_key = normalize_timestamp(date_val, time_val)
-                    if ts_key:
-                        if ts_key not in all_timeseries:
-                            all_timeseries[ts_key] = {}
-                        if tp_num not in all_timeseries[ts_key]:
-                            all_timeseries[ts_key][tp_num] = {}
-                        all_timeseries[ts_key][tp_num][param_name] = value
+            for tp_num, (ts_keys, values) in sheet_series.items():
+                for ts_key, value in zip(ts_keys.tolist(), values.tolist()):
+                    all_timeseries.setdefault(ts_key, {}).setdefault(tp_num, {})[param_name] = value
     
     # Finalize measurements
-    for tp_num in testpoints:
-        for param_name, m in testpoints[tp_num]["measurements"].items():
-            if m["count"] > 0:
-                m["avg"] = round(m["sum"] / m["count"], 2)
-                m["min"] = round(m["min"], 2)
-                m["max"] = round(m["max"], 2)
-            else:
-                m["avg"] = None
-                m["min"] = None
-                m["max"] = None
-            # Remove large values array for summary
-            del m["values"]
-            del m["sum"]
+    for (tp_num, param_name), chunks in samples.items():
+        arr = np.concatenate(chunks)
+        testpoints[tp_num]["measurements"][param_name] = {
+            "unit": param_units[param_name],
+            "min": round(float(arr.min()), 2),
+            "max": round(float(arr.max()), 2),
+            "count": int(arr.size),
+            "avg": round(float(arr.mean(dtype=np.float64)), 2),
+        }
     
     return testpoints, all_timeseries
 
+def load_parsed_workbook(filepath, cache_dir, use_cache=True):
+    """Return parse_excel_file(filepath), reusing a pickled result when possible.
+    
+    The cache key is the workbook's mtime and size plus this script's mtime,
+    so editing either the data or the parser forces a fresh parse.
+    """
+    st = os.stat(filepath)
+    script_mtime = os.stat(os.path.abspath(__file__)).st_mtime_ns
+    cache_path = os.path.join(cache_dir, f"{st.st_mtime_ns}-{st.st_size}-{script_mtime}.pkl")
+    
+    if use_cache and os.path.exists(cache_path):
+        print(f"Loading cached parse: {cache_path}")
+        with open(cache_path, "rb") as f:
+            return pickle.load(f)
+    
+    result = parse_excel_file(filepath)
+    os.makedirs(cache_dir, exist_ok=True)
+    
+    # Write to a temp file and swap it in, so an interrupted run never leaves a truncated pickle
+    with tempfile.NamedTemporaryFile(dir=cache_dir, suffix=".tmp", delete=False) as f:
+        try:
+            pickle.dump(result, f, protocol=5)
+        except BaseException:
+            f.close()
+            os.remove(f.name)
+            raise
+    os.replace(f.name, cache_path)
+    
+    # Drop entries for older workbook/script versions
+    for stale in glob.glob(os.path.join(cache_dir, "*.pkl")):
+        if stale != cache_path:
+            os.remove(stale)
+    return result
+
+def first_truthy(tp_wide, *params):
+    """Column-wise `a or b or ...` over a testpoint's params, with None for missing."""
+    result = tp_wide.get(params[-1], pd.Series(np.nan, index=tp_wide.index))
+    for param in reversed(params[:-1]):
+        if param in tp_wide:
+            col = tp_wide[param]
+            result = col.where(col.notna() & (col != 0), result)
+    return result.astype(object).where(result.notna(), None).tolist()
+
 def create_animation_data(all_timeseries, testpoints):
     """Create simplified animation data with timestamps."""
-    animation_data = []
+    if not all_timeseries:
+        return []
     
-    # Sort timestamps
-    sorted_times = sorted(all_timeseries.keys())
+    long_df = pd.DataFrame(
+        [
+            (ts, tp_num, param, value)
+            for ts, tp_data in all_timeseries.items()
+            for tp_num, data in tp_data.items()
+            for param, value in data.items()
+        ],
+        columns=["ts", "tp", "param", "value"],
+    )
+    # One row per timestamp (sorted), one column per (testpoint, param)
+    wide = long_df.pivot_table(index="ts", columns=["tp", "param"], values="value", aggfunc="last").sort_index()
     
-    for ts in sorted_times:
-        frame = {
-            "timestamp": ts,
-            "testpoints": {}
-        }
-        
-        for tp_num, data in all_timeseries[ts].items():
-            frame["testpoints"][tp_num] = {
-                "temperature": data.get("temperature") or data.get("air_temperature") or data.get("surface_temperature"),
-                "humidity": data.get("relative_humidity") or data.get("rh_station"),
-                "wind_speed": data.get("wind_speed"),
-                "solar_radiation": data.get("solar_radiation"),
+    # Resolve each animated field per testpoint as whole columns
+    tp_fields = {}
+    for tp_num in wide.columns.unique(level="tp"):
+        tp_wide = wide[tp_num]
+        tp_fields[tp_num] = (tp_wide.notna().any(axis=1).tolist(), {
+            "temperature": first_truthy(tp_wide, "temperature", "air_temperature", "surface_temperature"),
+            "humidity": first_truthy(tp_wide, "relative_humidity", "rh_station"),
+            "wind_speed": first_truthy(tp_wide, "wind_speed"),
+            "solar_radiation": first_truthy(tp_wide, "solar_radiation"),
+        })
+    
+    animation_data = []
+    for i, ts in enumerate(wide.index.tolist()):
+        animation_data.append({
+            "timestamp": format_timestamp(ts),
+            "testpoints": {
+                tp_num: {field: values[i] for field, values in fields.items()}
+                for tp_num, (present, fields) in tp_fields.items()
+                if present[i]
             }
-        
-        animation_data.append(frame)
+        })
     
     return animation_data
 
@@ -277,7 +394,17 @@ def create_summary(testpoints):
     
     return summary
 
+def write_json(path, obj):
+    """Write obj to path as indented JSON."""
+    with open(path, "wb") as f:
+        f.write(orjson.dumps(obj, default=str, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY))
+
 def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--no-cache", action="store_true",
+                        help="ignore the cached parse and re-read the Excel file")
+    args = parser.parse_args()
+    
     # Paths
     script_dir = os.path.dirname(os.path.abspath(__file__))
     project_root = os.path.dirname(script_dir)
@@ -287,8 +414,9 @@ def main():
     # Create output directory
     os.makedirs(output_dir, exist_ok=True)
     
-    # Parse Excel
-    testpoints, all_timeseries = parse_excel_file(excel_path)
+    # Parse Excel (cached between runs while the workbook is unchanged)
+    cache_dir = os.path.join(script_dir, ".cache")
+    testpoints, all_timeseries = load_parsed_workbook(excel_path, cache_dir, use_cache=not args.no_cache)
     
     # Create summary
     summary = create_summary(testpoints)
@@ -300,13 +428,11 @@ def main():
     animation_sampled = animation_data[::10] if len(animation_data) > 100 else animation_data
     
     # Save summary
-    with open(os.path.join(output_dir, "testpoints.json"), "w") as f:
-        json.dump(summary, f, indent=2)
+    write_json(os.path.join(output_dir, "testpoints.json"), summary)
     print(f"Saved testpoints summary to {output_dir}/testpoints.json")
     
     # Save animation data
-    with open(os.path.join(output_dir, "timeseries.json"), "w") as f:
-        json.dump(animation_sampled, f, indent=2)
+    write_json(os.path.join(output_dir, "timeseries.json"), animation_sampled)
     print(f"Saved timeseries data to {output_dir}/timeseries.json ({len(animation_sampled)} frames)")
     
     # Print summary